@@ -29,6 +29,10 @@ const unknownDetectionSchema = new mongoose.Schema({
   category: {
     type: String,
     default: null
+  },
+  zones: {
+    type: [String],
+    default: []
   }
 });
 
@@ -145,6 +145,16 @@ router.post("/event", upload.single("image"), async (req, res) => {
       console.warn("[FastAPI Event] Could not parse faceEncoding:", e.message);
     }
 
+    // Zones (ROI) the face was detected in, if any were configured
+    let zones = [];
+    try {
+      if (req.body.zones) {
+        zones = Array.isArray(req.body.zones) ? req.body.zones : JSON.parse(req.body.zones);
+      }
+    } catch (e) {
+      console.warn("[FastAPI Event] Could not parse zones:", e.message);
+    }
+
     // Check if this is a duplicate/similar detection
     const detectionResult = faceEncoding 
       ? shouldProcessDetection(userId, faceEncoding)
@@ -173,6 +183,7 @@ router.post("/event", upload.single("image"), async (req, res) => {
       imageUrl,
       cloudinaryPublicId,
       category: categoryName,
+      zones,
       timestamp: new Date()
     });
 
@@ -191,6 +202,7 @@ router.post("/event", upload.single("image"), async (req, res) => {
       imageUrl: record.imageUrl,
       timestamp: record.timestamp,
       category: categoryName,
+      zones: record.zones,
       message: `Unknown person detected!`
     });
 
@@ -21,8 +21,11 @@ router.post("/start", verifyToken, async (req, res) => {
     // Reload face cache before starting
     await reloadUserFaceCache(userId);
     
-    // Start surveillance in FastAPI
-    const result = await startSurveillance(userId);
+    // Start surveillance in FastAPI (optional per-session ROI zones)
+    const result = await startSurveillance(userId, req.body && req.body.zones);
+    if (result && result.success === false) {
+      return res.status(400).json({ error: result.message });
+    }
     
     // Track session
     activeSessions.set(userId, {
@@ -9,11 +9,11 @@ console.log('FASTAPI_URL =', FASTAPI_URL);
 /**
  * Start surveillance for a user
  */
-export const startSurveillance = async (userId) => {
+export const startSurveillance = async (userId, zones) => {
   try {
     const response = await axios.post(
       `${FASTAPI_URL}/surveillance/start`,
-      { userId },
+      { userId, zones },
       {
         headers: {
           'Authorization': `Bearer ${SYSTEM_TOKEN}`
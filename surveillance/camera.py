@@ -1,42 +1,333 @@
-import cv2, time, threading, os, requests
-from face_engine import detect_and_recognize
-from telegram import send_alert
+"""
+Headless edge runner.
+
+Runs the same face_engine pipeline as main.py, but as a plain CLI daemon for
+small edge boxes that do not need FastAPI/uvicorn. The loop runs in the main
+thread of a single process; the web stack is never imported. SIGTERM
+(systemctl/docker stop) stops the loop cleanly, like Ctrl+C.
+
+Usage:
+    python camera.py --user-id <id> [--max-fps 5] [--threads 1] [--max-rss-mb 500]
+    python camera.py --user-id <id> --duration 60 --stats    # benchmark run
+"""
+import os
+import gc
+import io
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from typing import Optional
+
+from dotenv import load_dotenv
+
+import startup
+import zones
+
+load_dotenv()
+
+BACKEND_URL = os.getenv("BACKEND_URL") or os.getenv("NODE_BACKEND_URL", "http://127.0.0.1:5001")
+DETECTION_COOLDOWN = 10  # seconds between events for the same face
+MIN_CAPTURE_WIDTH = 320  # Lowest resolution the memory budget steps down to
+EXIT_OVER_BUDGET = 3
 
-NODE_URL = os.getenv("NODE_BACKEND_URL")
 _running = False
 _thread = None
 
-def _camera_loop(user_id):
+# ============ RESOURCE BUDGET ============
+
+def limit_threads(threads: int):
+    """
+    Cap BLAS/OpenMP worker threads. Must run before numpy, cv2 or
+    face_recognition are imported to take effect.
+    """
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB (None if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, KB elsewhere
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except (ImportError, OSError):
+        return None
+
+def step_down_resolution(cap) -> bool:
+    """
+    Halve the capture resolution. Returns False if already at the minimum or
+    if the device ignored the change (many V4L2/DSHOW drivers do on an open
+    capture).
+    """
+    import cv2
+
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if not width or not height or width // 2 < MIN_CAPTURE_WIDTH:
+        return False
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width // 2)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height // 2)
+
+    new_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    new_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if not new_width or new_width >= width:
+        print(f"[EDGE] Camera ignored the resolution change (still {width}x{height})")
+        return False
+    print(f"[EDGE] Capture resolution lowered to {new_width}x{new_height}")
+    return True
+
+def enforce_memory_budget(max_rss_mb: Optional[float], cap) -> bool:
+    """
+    Keep RSS under the budget: collect garbage first, then lower the capture
+    resolution (smaller frame and detector buffers). Returns False once the
+    resolution is already at the minimum and RSS is still over budget.
+    """
+    if not max_rss_mb:
+        return True
+    rss = current_rss_mb()
+    if rss is None or rss <= max_rss_mb:
+        return True
+    gc.collect()
+    rss = current_rss_mb()
+    if rss is None or rss <= max_rss_mb:
+        return True
+    print(f"[EDGE] RSS {rss:.0f}MB over budget of {max_rss_mb:.0f}MB")
+    return step_down_resolution(cap)
+
+# ============ EVENTS ============
+
+def send_event(session, user_id: str, frame, face_type, face_name, face_encoding, face_zones=()):
+    """Post a detection to the backend (same payload as main.py)."""
+    import cv2
+
+    ok, buf = cv2.imencode(".jpg", frame)
+    if not ok:
+        print("[EDGE] Failed to encode frame")
+        return
+
+    data = {
+        "userId": user_id,
+        "faceEncoding": json.dumps(face_encoding.tolist()),
+        "zones": json.dumps(list(face_zones))
+    }
+    if not face_type:
+        data["categoryName"] = "Unknown Person"
+    elif face_type == "family":
+        data["familyName"] = face_name
+    elif face_type == "category":
+        data["categoryName"] = face_name
+
+    files = {
+        "image": (f"detection_{int(time.time())}.jpg", io.BytesIO(buf.tobytes()), "image/jpeg")
+    }
+    try:
+        response = session.post(f"{BACKEND_URL}/api/fastapi/event", data=data, files=files, timeout=20)
+        print(f"[EDGE] Sent {face_type or 'unknown'} detection: {face_name or 'Unknown'} ({response.status_code})")
+    except Exception as e:
+        print(f"[EDGE] Error sending detection: {e}")
+
+# ============ CAMERA LOOP ============
+
+def _camera_loop(user_id, camera_index=None, max_fps=5.0, detect_every=3,
+                 max_rss_mb=None, duration=None, send_events=True, zone_configs=None):
+    """
+    Capture, detect and report until stopped. Returns run statistics, with
+    "over_budget" set if the loop stopped because of the memory budget.
+    """
     global _running
-    cap = cv2.VideoCapture(0)
+    import cv2
+    import numpy as np
+    import requests
+    import face_engine
 
-    while _running:
-        ret, frame = cap.read()
-        if not ret:
-            continue
+    session = requests.Session()
+    face_engine.load_user_faces(user_id, BACKEND_URL, session=session)
 
-        unknown = detect_and_recognize(frame, user_id)
-        if unknown:
-            send_alert(unknown)
+    if camera_index is None:
+        cap = startup.acquire_camera_sync()
+    else:
+        cap, _ = startup.open_camera(camera_index, startup.DEFAULT_CAMERA_PROPS)
+    if cap is None:
+        print("[EDGE] ❌ No working camera found.")
+        session.close()
+        _running = False
+        return None
 
-            if NODE_URL:
-                requests.post(f"{NODE_URL}/api/fastapi/event",
-                              files={"image": open(unknown, "rb")},
-                              data={"userId": user_id})
+    last_detection_time = {}
+    frame_interval = 1.0 / max_fps if max_fps else 0.0
+    frame_count = 0
+    detections = 0
+    session_zones = []
+    zones_shape = None
+    peak_rss = current_rss_mb() or 0.0
+    over_budget = False
+    started = time.time()
+    first_frame_at = None  # fps is measured from here, like /status in main.py
 
-            time.sleep(10)
+    print("[EDGE] ✓ Camera ready. Starting face detection...")
+    try:
+        while _running:
+            loop_started = time.time()
+            if duration and loop_started - started >= duration:
+                break
 
-    cap.release()
+            ok, frame = cap.read()
+            if not ok or frame is None or frame.size == 0:
+                time.sleep(1)
+                continue
+            if np.mean(frame) < startup.MIN_BRIGHTNESS:
+                time.sleep(0.5)
+                continue
 
-def start_camera(user_id):
+            frame_count += 1
+            if first_frame_at is None:
+                first_frame_at = time.time()
+            if zone_configs and frame.shape != zones_shape:
+                session_zones = zones.prepare_zones(zone_configs, frame.shape)
+                zones_shape = frame.shape
+
+            if frame_count % detect_every == 0:
+                for face_encoding, face_location, face_zones in face_engine.detect_faces_in_zones(frame, session_zones):
+                    detections += 1
+                    face_type, face_name = face_engine.recognize_face(face_encoding, user_id, tolerance=0.6)
+
+                    if face_type:
+                        detection_key = f"{face_type}_{face_name}"
+                    else:
+                        detection_key = f"unknown_{hash(tuple(face_encoding[:10]))}"
+
+                    now = time.time()
+                    if now - last_detection_time.get(detection_key, 0) < DETECTION_COOLDOWN:
+                        continue
+                    last_detection_time[detection_key] = now
+
+                    top, right, bottom, left = face_location
+                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+                    cv2.putText(frame, face_name or "Unknown", (left, top - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                    if send_events:
+                        send_event(session, user_id, frame, face_type, face_name, face_encoding, face_zones)
+
+            if frame_count % 100 == 0:
+                peak_rss = max(peak_rss, current_rss_mb() or 0.0)
+                if not enforce_memory_budget(max_rss_mb, cap):
+                    print("[EDGE] ❌ Cannot get under the memory budget, stopping.")
+                    over_budget = True
+                    break
+
+            # Throttle to the CPU budget instead of spinning on cap.read()
+            remaining = frame_interval - (time.time() - loop_started)
+            if remaining > 0:
+                time.sleep(remaining)
+    finally:
+        cap.release()
+        session.close()
+        _running = False
+
+    ended = time.time()
+    elapsed = max(ended - (first_frame_at or ended), 1e-6)
+    return {
+        "frames": frame_count,
+        "faces": detections,
+        "seconds": round(ended - started, 1),
+        "fps": round(frame_count / elapsed, 2) if first_frame_at else 0.0,
+        "rss_mb": round(current_rss_mb() or 0.0, 1),
+        "peak_rss_mb": round(max(peak_rss, current_rss_mb() or 0.0), 1),
+        "over_budget": over_budget,
+    }
+
+def start_camera(user_id, **options):
+    """Run the camera loop in a background thread (for embedding)."""
     global _running, _thread
     if _running:
         return
 
     _running = True
-    _thread = threading.Thread(target=_camera_loop, args=(user_id,), daemon=True)
+    _thread = threading.Thread(target=_camera_loop, args=(user_id,), kwargs=options, daemon=True)
     _thread.start()
 
 def stop_camera():
     global _running
     _running = False
+
+def _handle_sigterm(signum, frame):
+    """systemctl/docker stop: finish the current frame, release the camera, print stats."""
+    print("[EDGE] SIGTERM received, stopping...")
+    stop_camera()
+
+# ============ CLI ============
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="EYeOn headless edge runner")
+    parser.add_argument("--user-id", required=True, help="User whose faces to recognize")
+    parser.add_argument("--camera-index", type=int, default=None,
+                        help="Camera index (default: cached camera, else probe)")
+    parser.add_argument("--max-fps", type=float, default=float(os.getenv("EDGE_MAX_FPS", 5)),
+                        help="Upper bound on frames read per second (0 = unbounded)")
+    parser.add_argument("--detect-every", type=int, default=int(os.getenv("EDGE_DETECT_EVERY", 3)),
+                        help="Run detection on every Nth frame")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("EDGE_THREADS", 1)),
+                        help="BLAS/OpenCV worker threads")
+    parser.add_argument("--max-rss-mb", type=float, default=float(os.getenv("EDGE_MAX_RSS_MB", 0)) or None,
+                        help="Resident memory budget in MB (resolution is lowered, then the runner exits with status 3)")
+    parser.add_argument("--zones", default=None,
+                        help="JSON file with ROI zones (same format as /surveillance/start)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stop after this many seconds")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print run statistics (fps, RSS) as JSON on exit")
+    parser.add_argument("--no-events", action="store_true",
+                        help="Do not post detections to the backend (benchmarking)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global _running
+    args = parse_args(argv)
+
+    zone_configs = []
+    if args.zones:
+        try:
+            with open(args.zones) as f:
+                zone_configs = zones.parse_zones(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"[EDGE] Invalid zones file: {e}")
+            return 2
+
+    limit_threads(args.threads)
+    import cv2
+    cv2.setNumThreads(args.threads)
+
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    _running = True
+    try:
+        stats = _camera_loop(
+            args.user_id,
+            camera_index=args.camera_index,
+            max_fps=args.max_fps,
+            detect_every=max(args.detect_every, 1),
+            max_rss_mb=args.max_rss_mb,
+            duration=args.duration,
+            send_events=not args.no_events,
+            zone_configs=zone_configs,
+        )
+    except KeyboardInterrupt:
+        print("[EDGE] Stopped")
+        return 0
+
+    if stats is None:
+        return 1
+    if args.stats:
+        print(json.dumps(stats))
+    return EXIT_OVER_BUDGET if stats["over_budget"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,66 +8,101 @@ from typing import Dict, List, Tuple, Optional
 # Per-user face cache
 FACE_CACHE: Dict[str, Dict] = {}
 
-def load_user_faces(user_id: str, backend_url: str) -> Dict:
+def load_user_faces(user_id: str, backend_url: str, session=None) -> Dict:
     """
     Load all known faces (family + categories) for a user.
+    Pass a requests.Session to fetch images over it with a thread pool
+    instead of the async httpx client (the edge runner does this).
     Returns dict with family_encodings and category_encodings.
     """
     try:
         import requests
+        from image_fetch import iter_images, iter_images_with_session, decode_image
+        
+        http = session or requests
         
         family_encodings = []
         category_encodings = {}
+        family_list = []
+        categories = []
         
         # Get family members
         try:
-            family_res = requests.get(
+            family_res = http.get(
                 f"{backend_url}/api/family/list",
                 headers={"Authorization": f"Bearer system-token"},
                 timeout=10
             )
             if family_res.status_code == 200:
                 family_list = family_res.json()
-                for member in family_list:
-                    try:
-                        image = face_recognition.load_image_file(member["imageUrl"])
-                        encodings = face_recognition.face_encodings(image)
-                        if encodings:
-                            family_encodings.append({
-                                "name": member.get("name", "Unknown"),
-                                "encoding": encodings[0]
-                            })
-                    except Exception as e:
-                        print(f"Error loading family member {member.get('name')}: {e}")
         except Exception as e:
             print(f"Error fetching family list: {e}")
         
         # Get categories (visitors)
         try:
-            cat_res = requests.get(
+            cat_res = http.get(
                 f"{backend_url}/api/category/list",
                 headers={"Authorization": f"Bearer system-token"},
                 timeout=10
             )
             if cat_res.status_code == 200:
                 categories = cat_res.json()
-                for cat in categories:
-                    try:
-                        image = face_recognition.load_image_file(cat["imageUrl"])
-                        encodings = face_recognition.face_encodings(image)
-                        if encodings:
-                            cat_name = cat.get("name", "Unknown")
-                            if cat_name not in category_encodings:
-                                category_encodings[cat_name] = []
-                            category_encodings[cat_name].append({
-                                "encoding": encodings[0],
-                                "description": cat.get("description", "")
-                            })
-                    except Exception as e:
-                        print(f"Error loading category {cat.get('name')}: {e}")
         except Exception as e:
             print(f"Error fetching categories: {e}")
         
+        # Fetch enrollment images concurrently (cached, ETag-revalidated) and
+        # encode each one as it arrives, so only a few raw images are held
+        image_urls = [item.get("imageUrl") for item in family_list + categories]
+        if session is not None:
+            images = iter_images_with_session(image_urls, session)
+        else:
+            images = iter_images(image_urls)
+        
+        encodings_by_url = {}  # url -> first face encoding, or the error
+        for url, data in images:
+            try:
+                if data is None:
+                    raise ValueError(f"image not available: {url}")
+                image = decode_image(data)
+                del data
+                if image is None:
+                    raise ValueError(f"could not decode image: {url}")
+                encodings = face_recognition.face_encodings(image)
+                encodings_by_url[url] = encodings[0] if encodings else None
+            except Exception as e:
+                encodings_by_url[url] = e
+        
+        def encoding_for(url):
+            encoding = encodings_by_url.get(url)
+            if isinstance(encoding, Exception):
+                raise encoding
+            return encoding
+        
+        for member in family_list:
+            try:
+                encoding = encoding_for(member.get("imageUrl"))
+                if encoding is not None:
+                    family_encodings.append({
+                        "name": member.get("name", "Unknown"),
+                        "encoding": encoding
+                    })
+            except Exception as e:
+                print(f"Error loading family member {member.get('name')}: {e}")
+        
+        for cat in categories:
+            try:
+                encoding = encoding_for(cat.get("imageUrl"))
+                if encoding is not None:
+                    cat_name = cat.get("name", "Unknown")
+                    if cat_name not in category_encodings:
+                        category_encodings[cat_name] = []
+                    category_encodings[cat_name].append({
+                        "encoding": encoding,
+                        "description": cat.get("description", "")
+                    })
+            except Exception as e:
+                print(f"Error loading category {cat.get('name')}: {e}")
+        
         # Cache the loaded data
         FACE_CACHE[user_id] = {
             "family_encodings": family_encodings,
@@ -113,17 +148,75 @@ def recognize_face(
     
     return (None, None)
 
+def locate_faces(frame: np.ndarray) -> List[Tuple]:
+    """
+    Find face boxes in a BGR frame.
+    Returns: List of (top, right, bottom, left) locations.
+    """
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return face_recognition.face_locations(rgb_frame)
+
+
+def encode_faces(frame: np.ndarray, face_locations: List[Tuple]) -> List[np.ndarray]:
+    """
+    Compute encodings for known face boxes in a BGR frame.
+    Returns: One encoding per location, in the same order.
+    """
+    if not face_locations:
+        return []
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return face_recognition.face_encodings(rgb_frame, face_locations)
+
+
 def detect_faces_in_frame(frame: np.ndarray) -> List[Tuple[np.ndarray, Tuple]]:
     """
     Detect all faces in a frame.
     Returns: List of (encoding, location) tuples.
     """
     try:
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        face_locations = locate_faces(frame)
+        face_encodings = encode_faces(frame, face_locations)
         return list(zip(face_encodings, face_locations))
     except Exception as e:
         print(f"Error detecting faces: {e}")
         return []
 
+
+def detect_faces_in_zones(frame: np.ndarray, zones: List[Dict]) -> List[Tuple[np.ndarray, Tuple, List[str]]]:
+    """
+    Detect faces only inside the active zones (see zones.py).
+    With no zones configured the whole frame is scanned.
+    Faces are located on the masked zone crops but encoded from the unmasked
+    frame, so blanked pixels around a face on a zone edge do not skew its
+    encoding.
+    Returns: List of (encoding, location, zone names) tuples.
+    """
+    from zones import masked_crop, zones_containing, face_center
+
+    if not zones:
+        return [(encoding, location, []) for encoding, location in detect_faces_in_frame(frame)]
+
+    try:
+        face_locations = []
+        for zone in zones:
+            if not zone["active"]:
+                continue
+            x0, y0, _, _ = zone["bbox"]
+            for top, right, bottom, left in locate_faces(masked_crop(frame, zone)):
+                location = (top + y0, right + x0, bottom + y0, left + x0)
+                cx, cy = face_center(location)
+
+                # Overlapping zones can find the same face twice
+                if any(t <= cy < b and l <= cx < r for t, r, b, l in face_locations):
+                    continue
+                face_locations.append(location)
+
+        face_encodings = encode_faces(frame, face_locations)
+    except Exception as e:
+        print(f"Error detecting faces: {e}")
+        return []
+
+    return [
+        (encoding, location, zones_containing(zones, face_center(location)))
+        for encoding, location in zip(face_encodings, face_locations)
+    ]
@@ -0,0 +1,361 @@
+import os
+import json
+import time
+import hashlib
+import queue
+import asyncio
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Enrollment image fetcher: concurrent downloads over one pooled client, a
+# local content-addressed blob cache with ETag revalidation, and size-aware
+# reduced-resolution decoding. Works against any HTTP server, including a
+# local `python -m http.server` for testing.
+#
+# Two transports share the cache logic: iter_images (async httpx, used by
+# main.py) and iter_images_with_session (requests.Session + thread pool,
+# used by the edge runner so it never imports httpx). Both yield images as
+# they arrive and keep at most ~2x concurrency raw images in memory.
+
+IMAGE_CACHE_DIR = os.getenv(
+    "IMAGE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".image_cache")
+)
+FETCH_CONCURRENCY = int(os.getenv("IMAGE_FETCH_CONCURRENCY", 8))
+FETCH_TIMEOUT = 20.0
+# Entries not seen in any gallery load for this long are dropped with their blob
+CACHE_MAX_AGE = float(os.getenv("IMAGE_CACHE_MAX_AGE_DAYS", 30)) * 86400
+
+# Decode so the long side lands around 600-1200px, plenty for one encoding
+REDUCE_BY_4_ABOVE = 2400
+REDUCE_BY_2_ABOVE = 1200
+
+# Guards the whole load-edit-save of the index and blob deletion
+_index_lock = threading.Lock()
+
+# ============ BLOB CACHE ============
+
+def _index_path() -> str:
+    return os.path.join(IMAGE_CACHE_DIR, "index.json")
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, digest[:2], digest)
+
+def load_index() -> Dict[str, Dict]:
+    """URL -> {"sha256", "etag", "last_modified", "last_seen"} for cached images."""
+    try:
+        with open(_index_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_index(index: Dict[str, Dict]):
+    """Write the index atomically. Callers hold _index_lock."""
+    try:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{_index_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, _index_path())
+    except OSError as e:
+        print(f"[FETCH] Could not save image cache index: {e}")
+
+def read_blob(digest: str) -> Optional[bytes]:
+    try:
+        with open(_blob_path(digest), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def write_blob(data: bytes) -> str:
+    """Store bytes under their sha256 and return the digest."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not os.path.exists(path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[FETCH] Could not cache image blob: {e}")
+    return digest
+
+def _delete_blob(digest: str):
+    try:
+        os.remove(_blob_path(digest))
+    except OSError:
+        pass
+
+def update_index(updates: Dict[str, Optional[Dict]]):
+    """
+    Merge fetch results into the index: url -> new entry, or None to drop
+    the URL. Entries no gallery load has seen within CACHE_MAX_AGE (photos
+    deleted from the backend, users that stopped using this box) are dropped
+    too, and blobs no longer referenced by any URL are deleted. The index is
+    reloaded under the lock so concurrent loads do not lose each other's
+    entries.
+    """
+    if not updates:
+        return
+    with _index_lock:
+        index = load_index()
+        replaced = set()
+        for url, entry in updates.items():
+            old = index.pop(url, None)
+            if entry is not None:
+                index[url] = entry
+            if old and (entry is None or old.get("sha256") != entry["sha256"]):
+                replaced.add(old.get("sha256"))
+
+        expire_before = time.time() - CACHE_MAX_AGE
+        for url in [u for u, entry in index.items() if entry.get("last_seen", 0) < expire_before]:
+            replaced.add(index.pop(url).get("sha256"))
+
+        still_used = {entry.get("sha256") for entry in index.values()}
+        for digest in replaced - still_used:
+            if digest:
+                _delete_blob(digest)
+        _save_index(index)
+
+# ============ FETCH ============
+
+_DONE = object()
+
+def _unique_urls(urls: List[str]) -> List[str]:
+    return list(dict.fromkeys(u for u in urls if u))
+
+def _is_remote(url: str) -> bool:
+    return url.startswith(("http://", "https://"))
+
+def _read_file(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError as e:
+        print(f"[FETCH] Error reading {path}: {e}")
+        return None
+
+def _revalidation_headers(url: str, index: Dict[str, Dict]) -> Tuple[Dict[str, str], Optional[bytes]]:
+    """Conditional request headers for a cached URL, plus the cached bytes."""
+    cached = index.get(url)
+    cached_data = read_blob(cached["sha256"]) if cached else None
+    headers = {}
+    if cached_data is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    return headers, cached_data
+
+def _mark_seen(url: str, index: Dict[str, Dict], updates: Dict[str, Optional[Dict]]):
+    """Refresh last_seen on a cached entry that is still in use."""
+    if url in index and url not in updates:
+        updates[url] = {**index[url], "last_seen": time.time()}
+
+def _handle_response(url: str, status: int, content: bytes, headers, cached_data: Optional[bytes],
+                     index: Dict[str, Dict], updates: Dict[str, Optional[Dict]]) -> Optional[bytes]:
+    """Turn an HTTP response into image bytes, recording index changes in updates."""
+    if status == 304 and cached_data is not None:
+        _mark_seen(url, index, updates)
+        return cached_data
+    if status == 200:
+        updates[url] = {
+            "sha256": write_blob(content),
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "last_seen": time.time(),
+        }
+        return content
+    print(f"[FETCH] {url} returned {status}")
+    if status in (404, 410):
+        # Photo is gone; drop it from the cache
+        updates[url] = None
+        return None
+    if cached_data is not None:
+        _mark_seen(url, index, updates)
+    return cached_data
+
+def _put_unless_stopped(results: queue.Queue, item, stop: threading.Event):
+    """Blocking put that gives up once the consumer has stopped reading."""
+    while not stop.is_set():
+        try:
+            results.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+async def _fetch_one(client, url: str, index: Dict[str, Dict],
+                     updates: Dict[str, Optional[Dict]]) -> Optional[bytes]:
+    """Fetch one image, revalidating any cached copy with ETag/Last-Modified."""
+    if not _is_remote(url):
+        # Local path (e.g. during development)
+        return await asyncio.to_thread(_read_file, url)
+
+    headers, cached_data = _revalidation_headers(url, index)
+    try:
+        response = await client.get(url, headers=headers)
+    except Exception as e:
+        if cached_data is not None:
+            print(f"[FETCH] {url} unreachable, using cached copy: {e}")
+            _mark_seen(url, index, updates)
+            return cached_data
+        print(f"[FETCH] Error fetching {url}: {e}")
+        return None
+
+    return await asyncio.to_thread(
+        _handle_response, url, response.status_code, response.content, response.headers,
+        cached_data, index, updates
+    )
+
+async def _produce_images(urls: List[str], concurrency: int, results: queue.Queue, stop: threading.Event):
+    """Fetch urls over one pooled httpx client and hand each result to the consumer."""
+    import httpx
+
+    index = load_index()
+    updates: Dict[str, Optional[Dict]] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def fetch_and_hand_over(url):
+        # The slot is held until the consumer takes the bytes, so at most
+        # `concurrency` images are downloading or waiting at any time
+        async with semaphore:
+            if stop.is_set():
+                return
+            data = await _fetch_one(client, url, index, updates)
+            await asyncio.to_thread(_put_unless_stopped, results, (url, data), stop)
+
+    try:
+        async with httpx.AsyncClient(limits=limits, timeout=FETCH_TIMEOUT, follow_redirects=True) as client:
+            await asyncio.gather(*(fetch_and_hand_over(url) for url in urls))
+    finally:
+        await asyncio.to_thread(update_index, updates)
+
+def iter_images(urls: List[str], concurrency: int = FETCH_CONCURRENCY) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Yield (url, bytes) as each download completes (bytes is None for images
+    that could not be fetched). Downloads run on an event loop in a worker
+    thread, so the caller can decode one image while the next ones arrive.
+    """
+    unique_urls = _unique_urls(urls)
+    if not unique_urls:
+        return
+    concurrency = max(concurrency, 1)
+    results: queue.Queue = queue.Queue(maxsize=concurrency)
+    stop = threading.Event()
+
+    def run():
+        try:
+            asyncio.run(_produce_images(unique_urls, concurrency, results, stop))
+        except Exception as e:
+            print(f"[FETCH] Image fetch failed: {e}")
+        finally:
+            _put_unless_stopped(results, _DONE, stop)
+
+    producer = threading.Thread(target=run, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def iter_images_with_session(urls: List[str], session,
+                             concurrency: int = FETCH_CONCURRENCY) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """
+    Same as iter_images, but over an existing requests.Session with a thread
+    pool. Used by the edge runner, which does not import httpx.
+    """
+    unique_urls = _unique_urls(urls)
+    if not unique_urls:
+        return
+    concurrency = max(concurrency, 1)
+    index = load_index()
+    updates: Dict[str, Optional[Dict]] = {}
+
+    def fetch_one(url):
+        if not _is_remote(url):
+            return url, _read_file(url)
+        headers, cached_data = _revalidation_headers(url, index)
+        try:
+            response = session.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+        except Exception as e:
+            if cached_data is not None:
+                print(f"[FETCH] {url} unreachable, using cached copy: {e}")
+                _mark_seen(url, index, updates)
+                return url, cached_data
+            print(f"[FETCH] Error fetching {url}: {e}")
+            return url, None
+        return url, _handle_response(url, response.status_code, response.content, response.headers,
+                                     cached_data, index, updates)
+
+    remaining = iter(unique_urls)
+    try:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(unique_urls))) as pool:
+            # Keep at most `concurrency` downloads in flight; submit the next
+            # one only after a finished image has been handed over
+            pending = {pool.submit(fetch_one, url) for url in islice(remaining, concurrency)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                    next_url = next(remaining, None)
+                    if next_url is not None:
+                        pending.add(pool.submit(fetch_one, next_url))
+    finally:
+        update_index(updates)
+
+def fetch_images_sync(urls: List[str], concurrency: int = FETCH_CONCURRENCY) -> Dict[str, Optional[bytes]]:
+    """Collect iter_images into url -> bytes (holds every image; prefer the iterator)."""
+    return dict(iter_images(urls, concurrency))
+
+def fetch_images_with_session(urls: List[str], session,
+                              concurrency: int = FETCH_CONCURRENCY) -> Dict[str, Optional[bytes]]:
+    """Collect iter_images_with_session into url -> bytes."""
+    return dict(iter_images_with_session(urls, session, concurrency))
+
+# ============ DECODE ============
+
+def _image_size(data: bytes):
+    """Read (width, height) from the image header without decoding pixels."""
+    try:
+        import io
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+def pick_decode_flag(width: int, height: int) -> int:
+    """Choose an OpenCV reduced-resolution decode flag from image dimensions."""
+    import cv2
+
+    longest = max(width, height)
+    if longest > REDUCE_BY_4_ABOVE:
+        return cv2.IMREAD_REDUCED_COLOR_4
+    if longest > REDUCE_BY_2_ABOVE:
+        return cv2.IMREAD_REDUCED_COLOR_2
+    return cv2.IMREAD_COLOR
+
+def decode_image(data: bytes):
+    """
+    Decode image bytes to an RGB array, at reduced resolution for large images.
+    Returns None if the bytes are not a decodable image.
+    """
+    import cv2
+    import numpy as np
+
+    size = _image_size(data)
+    flag = pick_decode_flag(*size) if size else cv2.IMREAD_COLOR
+    bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+    if bgr is None:
+        return None
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
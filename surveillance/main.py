@@ -1,17 +1,20 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 import os
 from datetime import datetime
 from dotenv import load_dotenv
 import asyncio
-import httpx
 import json
-import random
-import cv2
 import io
-import numpy as np
 import time
 
+import startup
+import zones
+
+# Heavy modules (cv2, numpy, httpx, face_engine) are imported where they are
+# used so that importing main stays cheap for cold-starting workers.
+
 load_dotenv()
 
 # Configuration
@@ -19,8 +22,21 @@ BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:5001")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+# Global surveillance state
+surveillance_active = False
+active_user_id = None
+surveillance_task = None
+active_zones = []  # Parsed zone configs for the current session
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Pre-warm face models on startup, release the camera on shutdown."""
+    startup.start_model_warmup()
+    yield
+    await stop_surveillance()
+
 # FastAPI app
-app = FastAPI(title="EYeOn Surveillance Engine")
+app = FastAPI(title="EYeOn Surveillance Engine", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,11 +46,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global surveillance state
-surveillance_active = False
-active_user_id = None
-surveillance_task = None
-
 # ============ HEALTH & STATUS ============
 
 @app.get("/health")
@@ -60,7 +71,9 @@ async def get_status():
     return {
         "running": surveillance_active,
         "user_id": active_user_id if surveillance_active else None,
+        "zones": zones.describe_zones(active_zones) if surveillance_active else [],
         "message": "Surveillance engine ready with real-time face detection",
+        "startup": startup.get_startup_status(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -105,52 +118,25 @@ async def clear_cache(user_id: str):
 
 # ============ SURVEILLANCE CONTROL ============
 
-async def perform_surveillance(user_id: str):
+async def perform_surveillance(user_id: str, zone_configs=None):
     """Perform real-time surveillance with actual face detection and recognition."""
     global surveillance_active
     
-    from face_engine import load_user_faces, detect_faces_in_frame, recognize_face
+    import cv2
+    import numpy as np
+    import httpx
     
-    # Load known faces for this user
-    print(f"[SURVEILLANCE] Loading known faces for user {user_id}...")
-    load_user_faces(user_id, BACKEND_URL)
+    # Models are normally already loaded by the lifespan warm-up
+    face_engine = await startup.ensure_models_ready()
+    detect_faces_in_zones = face_engine.detect_faces_in_zones
+    recognize_face = face_engine.recognize_face
     
-    # Try multiple camera indices
-    cap = None
-    for cam_idx in [0, 1, 2]:
-        print(f"[SURVEILLANCE] Trying camera index {cam_idx}...")
-        cap = cv2.VideoCapture(cam_idx, cv2.CAP_DSHOW)  # Use DirectShow on Windows
-        if cap.isOpened():
-            # Set camera properties for better quality
-            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            cap.set(cv2.CAP_PROP_FPS, 30)
-            
-            # Camera warm-up: discard first few frames
-            print(f"[SURVEILLANCE] Warming up camera {cam_idx}...")
-            for _ in range(5):
-                cap.read()
-                await asyncio.sleep(0.1)
-            
-            # Test if we can actually read a valid frame
-            ret, test_frame = cap.read()
-            if ret and test_frame is not None and test_frame.size > 0:
-                # Check if frame is not completely black
-                mean_brightness = np.mean(test_frame)
-                if mean_brightness > 10:  # Not a black frame
-                    print(f"[SURVEILLANCE] ✓ Camera {cam_idx} working (brightness: {mean_brightness:.1f})")
-                    break
-                else:
-                    print(f"[SURVEILLANCE] Camera {cam_idx} produces black frames (brightness: {mean_brightness:.1f})")
-            else:
-                print(f"[SURVEILLANCE] Camera {cam_idx} failed frame test")
-            
-            cap.release()
-            cap = None
-        else:
-            if cap:
-                cap.release()
-            cap = None
+    # Load known faces and open the camera concurrently
+    print(f"[SURVEILLANCE] Loading known faces for user {user_id}...")
+    _, cap = await asyncio.gather(
+        asyncio.to_thread(face_engine.load_user_faces, user_id, BACKEND_URL),
+        startup.acquire_camera()
+    )
     
     if not cap or not cap.isOpened():
         print("[SURVEILLANCE] ❌ No working camera found. Cannot start surveillance.")
@@ -163,6 +149,8 @@ async def perform_surveillance(user_id: str):
     last_detection_time = {}
     detection_cooldown = 10  # seconds between detections of same face
     frame_count = 0
+    session_zones = []  # Precomputed masks, built once the frame size is known
+    zones_shape = None
     
     try:
         while surveillance_active and active_user_id == user_id:
@@ -185,15 +173,21 @@ async def perform_surveillance(user_id: str):
                     continue
                 
                 frame_count += 1
+                startup.mark_frame()
+                
+                if zone_configs and frame.shape != zones_shape:
+                    session_zones = zones.prepare_zones(zone_configs, frame.shape)
+                    zones_shape = frame.shape
                 
-                # Detect faces in frame (every 3rd frame to reduce CPU load)
+                # Detect faces in active zones (every 3rd frame to reduce CPU load)
                 if frame_count % 3 == 0:
-                    faces = detect_faces_in_frame(frame)
+                    faces = detect_faces_in_zones(frame, session_zones)
                     
                     if faces:
+                        startup.mark_first_detection()
                         print(f"[SURVEILLANCE] Detected {len(faces)} face(s) in frame")
                         
-                        for face_encoding, face_location in faces:
+                        for face_encoding, face_location, face_zones in faces:
                             # Recognize the face
                             face_type, face_name = recognize_face(face_encoding, user_id, tolerance=0.6)
                             
@@ -240,7 +234,8 @@ async def perform_surveillance(user_id: str):
                             
                             data = {
                                 "userId": user_id,
-                                "faceEncoding": json.dumps(face_encoding.tolist())
+                                "faceEncoding": json.dumps(face_encoding.tolist()),
+                                "zones": json.dumps(face_zones)
                             }
                             
                             # Add category name for unknown faces
@@ -272,6 +267,7 @@ async def perform_surveillance(user_id: str):
                 await asyncio.sleep(1)
     
     finally:
+        startup.mark_session_stopped()
         # Always release camera when done
         if cap is not None:
             try:
@@ -283,7 +279,7 @@ async def perform_surveillance(user_id: str):
 @app.post("/surveillance/start")
 async def start_surveillance(data: dict):
     """Start surveillance for a user."""
-    global surveillance_active, active_user_id, surveillance_task
+    global surveillance_active, active_user_id, surveillance_task, active_zones
     
     try:
         user_id = data.get("userId")
@@ -294,16 +290,25 @@ async def start_surveillance(data: dict):
         if surveillance_active:
             return {"success": False, "message": "Surveillance already running"}
         
+        # Optional ROI zones: [{"name", "polygon": [[x, y], ...] (0..1), "active"}]
+        try:
+            zone_configs = zones.parse_zones(data.get("zones"))
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        
         # Start surveillance
         surveillance_active = True
         active_user_id = user_id
-        surveillance_task = asyncio.create_task(perform_surveillance(user_id))
+        active_zones = zone_configs
+        startup.mark_session_started()
+        surveillance_task = asyncio.create_task(perform_surveillance(user_id, zone_configs))
         
         print(f"[SURVEILLANCE] Started for user {user_id}")
         
         return {
             "status": "started",
             "user_id": user_id,
+            "zones": zones.describe_zones(zone_configs),
             "message": "Surveillance started with real-time face detection",
             "timestamp": datetime.now().isoformat()
         }
@@ -319,6 +324,7 @@ async def stop_surveillance():
     try:
         surveillance_active = False
         active_user_id = None
+        startup.mark_session_stopped()
         
         if surveillance_task:
             surveillance_task.cancel()
@@ -343,10 +349,7 @@ async def stop_surveillance():
 # ============ STARTUP & SHUTDOWN ============
 
 @app.get("/startup")
-async def startup():
-    print("FastAPI Surveillance Engine started (mock mode - camera not available)")
-    return {"status": "startup"}
-
-# Note: Shutdown events are deprecated in newer FastAPI versions
-# Use lifespan context managers instead in production
+async def startup_status():
+    """Model warm-up and camera startup timings."""
+    return {"status": "startup", **startup.get_startup_status()}
 
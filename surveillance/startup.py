@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+# cv2 / numpy / face_engine are imported inside functions so that importing
+# this module (and main.py) stays cheap.
+
+CAMERA_INDICES = [0, 1, 2]
+CAMERA_CACHE_PATH = os.getenv(
+    "CAMERA_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".camera_cache.json")
+)
+DEFAULT_CAMERA_PROPS = {"width": 640, "height": 480, "fps": 30}
+MIN_BRIGHTNESS = 10  # Frames darker than this are treated as black/covered
+CACHED_CAMERA_SETTLE_SECONDS = 2.0  # Time a cached camera gets for auto-exposure to settle
+
+# Background model warm-up task (created at app lifespan start)
+_models_task: Optional[asyncio.Task] = None
+
+# Startup timings, exposed through /status
+STARTUP_METRICS: Dict = {
+    "models_ready": False,
+    "models_load_seconds": None,
+    "session_started_at": None,
+    "first_frame_at": None,
+    "first_detection_at": None,
+    "frames": 0,
+    "session_stopped_at": None,
+    "camera_index": None,
+    "camera_source": None,  # "cache" or "probe"
+}
+
+# ============ MODEL PRE-WARM ============
+
+def warm_up_models():
+    """
+    Import face_engine (loads the dlib detector/encoder models) and run one
+    detection on a blank frame so the first real frame does not pay for it.
+    """
+    started = time.time()
+    import numpy as np
+    import face_engine
+
+    face_engine.detect_faces_in_frame(np.zeros((120, 160, 3), dtype=np.uint8))
+
+    STARTUP_METRICS["models_ready"] = True
+    STARTUP_METRICS["models_load_seconds"] = round(time.time() - started, 3)
+    print(f"[STARTUP] ✓ Face models loaded in {STARTUP_METRICS['models_load_seconds']}s")
+    return face_engine
+
+def start_model_warmup() -> asyncio.Task:
+    """Start loading the face models in a background thread (idempotent)."""
+    global _models_task
+    if _models_task is None:
+        _models_task = asyncio.create_task(asyncio.to_thread(warm_up_models))
+    return _models_task
+
+async def ensure_models_ready():
+    """Wait for the background warm-up and return the face_engine module."""
+    task = start_model_warmup()
+    try:
+        return await asyncio.shield(task)
+    except Exception as e:
+        # Warm-up failed; fall back to a plain import so the error surfaces here
+        print(f"[STARTUP] Model warm-up failed: {e}")
+        import face_engine
+        return face_engine
+
+# ============ CAMERA CACHE ============
+
+def load_camera_cache() -> Optional[Dict]:
+    """Return the last known-good camera index and properties, if any."""
+    try:
+        with open(CAMERA_CACHE_PATH, "r") as f:
+            cached = json.load(f)
+        if isinstance(cached.get("index"), int):
+            return cached
+    except (OSError, ValueError):
+        pass
+    return None
+
+def save_camera_cache(index: int, props: Dict):
+    """Remember a working camera index and its properties."""
+    try:
+        with open(CAMERA_CACHE_PATH, "w") as f:
+            json.dump({"index": index, **props, "saved_at": time.time()}, f)
+    except OSError as e:
+        print(f"[STARTUP] Could not save camera cache: {e}")
+
+# ============ CAMERA PROBE ============
+
+def _capture_api():
+    """DirectShow on Windows, V4L2 on Linux, the default backend elsewhere."""
+    import cv2
+    if os.name == "nt":
+        return cv2.CAP_DSHOW
+    if sys.platform.startswith("linux"):
+        return cv2.CAP_V4L2
+    return cv2.CAP_ANY
+
+def _can_probe_in_parallel() -> bool:
+    """
+    Only V4L2 opens devices independently. DirectShow shares one global
+    videoInput instance that is not safe to use from several threads, and
+    other backends are unverified, so they are probed one at a time.
+    """
+    import cv2
+    return _capture_api() == cv2.CAP_V4L2
+
+def open_camera(index: int, props: Dict, warmup_reads: int = 5, settle_seconds: float = 0.0):
+    """
+    Open a camera and check that it produces a non-black frame.
+    With settle_seconds, keep reading until a frame passes the brightness
+    check or the deadline expires (webcams send dark frames while
+    auto-exposure settles).
+    Returns (cap, props) on success or (None, None).
+    """
+    import cv2
+    import numpy as np
+
+    cap = cv2.VideoCapture(index, _capture_api())
+    if not cap.isOpened():
+        cap.release()
+        return None, None
+
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, props.get("width", DEFAULT_CAMERA_PROPS["width"]))
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, props.get("height", DEFAULT_CAMERA_PROPS["height"]))
+    cap.set(cv2.CAP_PROP_FPS, props.get("fps", DEFAULT_CAMERA_PROPS["fps"]))
+
+    # Camera warm-up: discard first few frames
+    for _ in range(warmup_reads):
+        cap.read()
+        time.sleep(0.05)
+
+    deadline = time.time() + settle_seconds
+    while True:
+        ret, test_frame = cap.read()
+        mean_brightness = np.mean(test_frame) if ret and test_frame is not None and test_frame.size > 0 else None
+        if (mean_brightness is not None and mean_brightness > MIN_BRIGHTNESS) or time.time() >= deadline:
+            break
+        time.sleep(0.05)
+
+    if mean_brightness is not None:
+        if mean_brightness > MIN_BRIGHTNESS:
+            actual = {
+                "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or props.get("width"),
+                "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or props.get("height"),
+                "fps": int(cap.get(cv2.CAP_PROP_FPS)) or props.get("fps"),
+            }
+            print(f"[STARTUP] ✓ Camera {index} working (brightness: {mean_brightness:.1f})")
+            return cap, actual
+        print(f"[STARTUP] Camera {index} produces black frames (brightness: {mean_brightness:.1f})")
+    else:
+        print(f"[STARTUP] Camera {index} failed frame test")
+
+    cap.release()
+    return None, None
+
+def probe_cameras(indices=CAMERA_INDICES) -> Tuple[Optional[object], Optional[int], Optional[Dict]]:
+    """
+    Probe camera indices, concurrently where the backend allows it.
+    Returns (cap, index, props) for the lowest working index; the rest are released.
+    """
+    if not _can_probe_in_parallel():
+        for idx in indices:
+            try:
+                cap, props = open_camera(idx, DEFAULT_CAMERA_PROPS)
+            except Exception as e:
+                print(f"[STARTUP] Camera {idx} probe error: {e}")
+                continue
+            if cap is not None:
+                return cap, idx, props
+        return None, None, None
+
+    with ThreadPoolExecutor(max_workers=len(indices)) as pool:
+        futures = {idx: pool.submit(open_camera, idx, DEFAULT_CAMERA_PROPS) for idx in indices}
+        results = {}
+        for idx, future in futures.items():
+            try:
+                results[idx] = future.result()
+            except Exception as e:
+                print(f"[STARTUP] Camera {idx} probe error: {e}")
+                results[idx] = (None, None)
+
+    chosen = (None, None, None)
+    for idx in indices:
+        cap, props = results[idx]
+        if cap is None:
+            continue
+        if chosen[0] is None:
+            chosen = (cap, idx, props)
+        else:
+            cap.release()
+    return chosen
+
+def acquire_camera_sync():
+    """Open the cached camera, falling back to a probe on a cache miss."""
+    cached = load_camera_cache()
+    if cached:
+        print(f"[STARTUP] Trying cached camera index {cached['index']}...")
+        cap, props = open_camera(
+            cached["index"], cached, warmup_reads=0, settle_seconds=CACHED_CAMERA_SETTLE_SECONDS
+        )
+        if cap is not None:
+            STARTUP_METRICS["camera_index"] = cached["index"]
+            STARTUP_METRICS["camera_source"] = "cache"
+            return cap
+        # Keep the cache: a successful probe below overwrites it anyway
+        print("[STARTUP] Cached camera unavailable, probing all devices...")
+
+    cap, index, props = probe_cameras()
+    if cap is not None:
+        save_camera_cache(index, props)
+        STARTUP_METRICS["camera_index"] = index
+        STARTUP_METRICS["camera_source"] = "probe"
+    return cap
+
+def _release_acquired_camera(future: asyncio.Future):
+    """Release a camera whose acquisition finished after the caller gave up."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    cap = future.result()
+    if cap is not None:
+        cap.release()
+        print("[STARTUP] Released camera acquired after cancellation")
+
+async def acquire_camera():
+    """
+    Async wrapper so camera probing does not block the event loop.
+    If the caller is cancelled (e.g. /surveillance/stop) while the worker
+    thread is still opening the device, the camera it returns is released.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(acquire_camera_sync))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(_release_acquired_camera)
+        raise
+
+# ============ TIMINGS ============
+
+def mark_session_started():
+    """Reset per-session timings when surveillance starts."""
+    STARTUP_METRICS["session_started_at"] = time.time()
+    STARTUP_METRICS["first_frame_at"] = None
+    STARTUP_METRICS["first_detection_at"] = None
+    STARTUP_METRICS["frames"] = 0
+    STARTUP_METRICS["session_stopped_at"] = None
+
+def mark_session_stopped():
+    """Freeze the frame rate when the session ends."""
+    if STARTUP_METRICS["session_stopped_at"] is None:
+        STARTUP_METRICS["session_stopped_at"] = time.time()
+
+def mark_frame():
+    """Count a processed frame and remember when the first one arrived."""
+    STARTUP_METRICS["frames"] += 1
+    if STARTUP_METRICS["first_frame_at"] is None:
+        STARTUP_METRICS["first_frame_at"] = time.time()
+
+def mark_first_detection():
+    if STARTUP_METRICS["first_detection_at"] is None:
+        STARTUP_METRICS["first_detection_at"] = time.time()
+
+def _elapsed(key: str) -> Optional[float]:
+    started = STARTUP_METRICS["session_started_at"]
+    value = STARTUP_METRICS[key]
+    if started is None or value is None:
+        return None
+    return round(value - started, 3)
+
+def _fps() -> Optional[float]:
+    # Measured from the first frame, like the edge runner's --stats, so model,
+    # gallery and camera startup are not counted
+    first_frame = STARTUP_METRICS["first_frame_at"]
+    if first_frame is None:
+        return None
+    end = STARTUP_METRICS["session_stopped_at"] or time.time()
+    return round(STARTUP_METRICS["frames"] / max(end - first_frame, 1e-6), 2)
+
+def get_startup_status() -> Dict:
+    """Startup timings for the /status endpoint."""
+    return {
+        "models_ready": STARTUP_METRICS["models_ready"],
+        "models_load_seconds": STARTUP_METRICS["models_load_seconds"],
+        "camera_index": STARTUP_METRICS["camera_index"],
+        "camera_source": STARTUP_METRICS["camera_source"],
+        "time_to_first_frame": _elapsed("first_frame_at"),
+        "time_to_first_detection": _elapsed("first_detection_at"),
+        "frames": STARTUP_METRICS["frames"],
+        "fps": _fps(),
+    }
@@ -0,0 +1,192 @@
+import os
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("httpx")
+requests = pytest.importorskip("requests")
+
+import image_fetch
+
+
+class StaticHandler(BaseHTTPRequestHandler):
+    """Serves FILES with strong ETags and answers If-None-Match with 304."""
+
+    files = {}
+    requests_seen = []
+
+    def do_GET(self):
+        body = self.files.get(self.path)
+        self.requests_seen.append((self.path, dict(self.headers)))
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StaticHandler.files = {"/face.jpg": b"first image bytes"}
+    StaticHandler.requests_seen = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StaticHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_fetch, "IMAGE_CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+def fetch_async(urls):
+    return image_fetch.fetch_images_sync(urls)
+
+
+def fetch_session(urls):
+    with requests.Session() as session:
+        return image_fetch.fetch_images_with_session(urls, session)
+
+
+@pytest.fixture(params=[fetch_async, fetch_session], ids=["httpx", "requests"])
+def fetch(request):
+    return request.param
+
+
+def test_first_fetch_downloads_and_writes_blob(server, fetch):
+    url = f"{server}/face.jpg"
+    images = fetch([url])
+
+    assert images[url] == b"first image bytes"
+    digest = hashlib.sha256(b"first image bytes").hexdigest()
+    assert os.path.exists(image_fetch._blob_path(digest))
+    entry = image_fetch.load_index()[url]
+    assert entry["sha256"] == digest
+    assert entry["etag"] == f'"{digest}"'
+
+
+def test_second_fetch_revalidates_with_etag(server, fetch):
+    url = f"{server}/face.jpg"
+    fetch([url])
+    images = fetch([url])
+
+    assert images[url] == b"first image bytes"
+    _, headers = StaticHandler.requests_seen[-1]
+    assert headers.get("If-None-Match") == image_fetch.load_index()[url]["etag"]
+
+
+def test_changed_image_replaces_old_blob(server, fetch):
+    url = f"{server}/face.jpg"
+    fetch([url])
+    old_digest = image_fetch.load_index()[url]["sha256"]
+
+    StaticHandler.files["/face.jpg"] = b"second image bytes"
+    images = fetch([url])
+
+    assert images[url] == b"second image bytes"
+    assert image_fetch.load_index()[url]["sha256"] != old_digest
+    assert not os.path.exists(image_fetch._blob_path(old_digest))
+
+
+def test_missing_image_is_pruned(server, fetch):
+    url = f"{server}/face.jpg"
+    fetch([url])
+    digest = image_fetch.load_index()[url]["sha256"]
+
+    del StaticHandler.files["/face.jpg"]
+    images = fetch([url])
+
+    assert images[url] is None
+    assert url not in image_fetch.load_index()
+    assert not os.path.exists(image_fetch._blob_path(digest))
+
+
+def test_unused_entries_expire_with_their_blob(server, fetch, monkeypatch):
+    old_url, url = f"{server}/old.jpg", f"{server}/face.jpg"
+    StaticHandler.files["/old.jpg"] = b"old image bytes"
+    fetch([old_url])
+    old_digest = image_fetch.load_index()[old_url]["sha256"]
+
+    # The old photo is no longer part of any gallery; age it past the limit
+    monkeypatch.setattr(image_fetch, "CACHE_MAX_AGE", 3600)
+    index = image_fetch.load_index()
+    index[old_url]["last_seen"] -= 7200
+    with image_fetch._index_lock:
+        image_fetch._save_index(index)
+
+    fetch([url])
+
+    index = image_fetch.load_index()
+    assert old_url not in index and url in index
+    assert not os.path.exists(image_fetch._blob_path(old_digest))
+
+
+def test_revalidated_entry_stays_fresh(server, fetch):
+    url = f"{server}/face.jpg"
+    fetch([url])
+    first_seen = image_fetch.load_index()[url]["last_seen"]
+
+    time.sleep(0.01)
+    fetch([url])
+
+    assert image_fetch.load_index()[url]["last_seen"] > first_seen
+
+
+def iter_async(urls, concurrency):
+    return image_fetch.iter_images(urls, concurrency)
+
+
+def iter_session(urls, concurrency):
+    session = requests.Session()
+    return image_fetch.iter_images_with_session(urls, session, concurrency)
+
+
+@pytest.mark.parametrize("iterate", [iter_async, iter_session], ids=["httpx", "requests"])
+def test_images_stream_with_bounded_buffering(server, iterate):
+    StaticHandler.files = {f"/face{i}.jpg": b"image %d" % i for i in range(10)}
+    urls = [f"{server}/face{i}.jpg" for i in range(10)]
+
+    images = iterate(urls, 2)
+    url, data = next(images)
+    assert data == StaticHandler.files[url[len(server):]]
+
+    # A slow consumer holds back the rest: at most 2 downloading and 2 queued
+    time.sleep(0.3)
+    assert len(StaticHandler.requests_seen) <= 5
+
+    rest = dict(images)
+    assert len(rest) == 9 and None not in rest.values()
+
+
+@pytest.mark.parametrize("size, flag", [
+    ((1200, 900), cv2.IMREAD_COLOR),
+    ((1201, 900), cv2.IMREAD_REDUCED_COLOR_2),
+    ((900, 2400), cv2.IMREAD_REDUCED_COLOR_2),
+    ((2401, 1600), cv2.IMREAD_REDUCED_COLOR_4),
+    ((1600, 2401), cv2.IMREAD_REDUCED_COLOR_4),
+])
+def test_pick_decode_flag_thresholds(size, flag):
+    assert image_fetch.pick_decode_flag(*size) == flag
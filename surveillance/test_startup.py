@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+import startup
+
+
+class FakeCapture:
+    """cv2.VideoCapture stand-in: each index yields a scripted brightness sequence."""
+
+    devices = {}  # index -> list of brightness values; the last one repeats
+    opened = []
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def __init__(self, index, api=None):
+        self.index = index
+        self.frames = list(self.devices.get(index, []))
+        self.released = False
+        with self.lock:
+            FakeCapture.opened.append(index)
+            FakeCapture.active += 1
+            FakeCapture.max_active = max(FakeCapture.max_active, FakeCapture.active)
+        time.sleep(0.02)  # Give concurrent probes a chance to overlap
+
+    def isOpened(self):
+        return self.index in self.devices
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        return 0
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        value = self.frames.pop(0) if len(self.frames) > 1 else self.frames[0]
+        return True, np.full((4, 4, 3), value, dtype=np.uint8)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            with self.lock:
+                FakeCapture.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def fake_camera(tmp_path, monkeypatch):
+    FakeCapture.devices = {}
+    FakeCapture.opened = []
+    FakeCapture.active = 0
+    FakeCapture.max_active = 0
+    monkeypatch.setattr(cv2, "VideoCapture", FakeCapture)
+    monkeypatch.setattr(startup, "CAMERA_CACHE_PATH", str(tmp_path / "camera.json"))
+    monkeypatch.setattr(startup, "STARTUP_METRICS", dict(startup.STARTUP_METRICS))
+    return FakeCapture
+
+
+def test_camera_cache_round_trip():
+    assert startup.load_camera_cache() is None
+    startup.save_camera_cache(1, {"width": 640, "height": 480, "fps": 30})
+
+    cached = startup.load_camera_cache()
+    assert cached["index"] == 1
+    assert cached["width"] == 640
+
+
+def test_corrupt_camera_cache_is_ignored():
+    with open(startup.CAMERA_CACHE_PATH, "w") as f:
+        f.write("{not json")
+    assert startup.load_camera_cache() is None
+
+    with open(startup.CAMERA_CACHE_PATH, "w") as f:
+        f.write('{"width": 640}')
+    assert startup.load_camera_cache() is None
+
+
+def test_cached_camera_waits_for_exposure_to_settle(fake_camera):
+    fake_camera.devices = {0: [200], 1: [0, 0, 0, 0, 120]}
+    startup.save_camera_cache(1, startup.DEFAULT_CAMERA_PROPS)
+
+    cap = startup.acquire_camera_sync()
+
+    assert cap.index == 1
+    assert fake_camera.opened == [1]
+    assert startup.STARTUP_METRICS["camera_source"] == "cache"
+
+
+def test_dark_cached_camera_falls_back_to_probe(fake_camera, monkeypatch):
+    monkeypatch.setattr(startup, "CACHED_CAMERA_SETTLE_SECONDS", 0.1)
+    fake_camera.devices = {0: [150], 1: [0]}
+    startup.save_camera_cache(1, startup.DEFAULT_CAMERA_PROPS)
+
+    cap = startup.acquire_camera_sync()
+
+    assert cap.index == 0
+    assert startup.load_camera_cache()["index"] == 0
+    assert startup.STARTUP_METRICS["camera_source"] == "probe"
+
+
+def test_failed_probe_keeps_camera_cache(fake_camera, monkeypatch):
+    monkeypatch.setattr(startup, "CACHED_CAMERA_SETTLE_SECONDS", 0.1)
+    fake_camera.devices = {1: [0]}
+    startup.save_camera_cache(1, startup.DEFAULT_CAMERA_PROPS)
+
+    assert startup.acquire_camera_sync() is None
+    assert startup.load_camera_cache()["index"] == 1
+
+
+def test_probe_is_serial_without_v4l2(fake_camera, monkeypatch):
+    monkeypatch.setattr(startup, "_capture_api", lambda: cv2.CAP_DSHOW)
+    fake_camera.devices = {0: [0], 1: [150], 2: [150]}
+
+    cap, index, _ = startup.probe_cameras()
+
+    assert index == 1 and cap.index == 1
+    assert fake_camera.opened == [0, 1]  # Stops at the first working camera
+    assert fake_camera.max_active == 1
+
+
+def test_probe_is_parallel_on_v4l2(fake_camera, monkeypatch):
+    monkeypatch.setattr(startup, "_capture_api", lambda: cv2.CAP_V4L2)
+    fake_camera.devices = {0: [0], 1: [150], 2: [150]}
+
+    cap, index, _ = startup.probe_cameras()
+
+    assert index == 1 and not cap.released
+    assert sorted(fake_camera.opened) == [0, 1, 2]
+    assert fake_camera.max_active > 1
+    assert fake_camera.active == 1  # Only the chosen camera stays open
+
+
+def test_cancelled_acquire_releases_camera(monkeypatch):
+    cap = FakeCapture(0)
+
+    def slow_acquire():
+        time.sleep(0.2)
+        return cap
+
+    monkeypatch.setattr(startup, "acquire_camera_sync", slow_acquire)
+
+    async def run():
+        task = asyncio.ensure_future(startup.acquire_camera())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.4)
+
+    asyncio.run(run())
+    assert cap.released
+
+
+def test_timings_are_measured_per_session():
+    metrics = startup.STARTUP_METRICS
+    startup.mark_session_started()
+    assert startup.get_startup_status()["fps"] is None
+
+    metrics.update({
+        "session_started_at": 100.0,
+        "first_frame_at": 102.0,
+        "first_detection_at": None,
+        "frames": 20,
+        "session_stopped_at": 112.0,
+    })
+    status = startup.get_startup_status()
+
+    assert status["time_to_first_frame"] == 2.0
+    assert status["time_to_first_detection"] is None
+    assert status["fps"] == 2.0  # From the first frame to the stop, frozen after it
+
+    startup.mark_session_stopped()
+    assert metrics["session_stopped_at"] == 112.0
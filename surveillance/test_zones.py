@@ -0,0 +1,123 @@
+import sys
+import types
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+import zones
+
+LEFT = {"name": "left", "polygon": [[0, 0], [0.6, 0], [0.6, 1], [0, 1]]}
+RIGHT = {"name": "right", "polygon": [[0.4, 0], [1, 0], [1, 1], [0.4, 1]]}
+TRIANGLE = {"name": "triangle", "polygon": [[0, 0], [1, 0], [0, 1]]}
+
+
+@pytest.fixture
+def face_engine(monkeypatch):
+    """face_engine with a stub face_recognition when dlib is not installed."""
+    try:
+        import face_recognition  # noqa: F401
+    except ImportError:
+        monkeypatch.setitem(sys.modules, "face_recognition", types.ModuleType("face_recognition"))
+    # Import fresh against the stub and put back whatever was there before
+    monkeypatch.setitem(sys.modules, "face_engine", None)
+    del sys.modules["face_engine"]
+    import face_engine
+    return face_engine
+
+
+def test_parse_zones_accepts_valid_config():
+    parsed = zones.parse_zones([LEFT, dict(RIGHT, active=False)])
+
+    assert [z["name"] for z in parsed] == ["left", "right"]
+    assert [z["active"] for z in parsed] == [True, False]
+    assert parsed[0]["polygon"][1] == (0.6, 0.0)
+    assert zones.parse_zones(None) == []
+    assert zones.parse_zones([]) == []
+
+
+@pytest.mark.parametrize("config, message", [
+    ([dict(LEFT, active=False)], "at least one zone must be active"),
+    ([dict(LEFT, active="false")], "active must be true or false"),
+    ([dict(LEFT, polygon=[[0, 0], [0.5, 0.5], [1, 1]])], "no area"),
+    ([dict(LEFT, polygon=[[0, 0], [True, 0], [1, 1]])], "between 0 and 1"),
+    ([dict(LEFT, polygon=[[0, 0], [1.5, 0], [1, 1]])], "between 0 and 1"),
+    ([dict(LEFT, polygon=[[0, 0], [1, 0]])], "at least 3 points"),
+    ([LEFT, LEFT], "duplicate zone name"),
+    ([dict(LEFT, name="")], "needs a name"),
+    ({"name": "left"}, "must be a list"),
+])
+def test_parse_zones_rejects_bad_config(config, message):
+    with pytest.raises(ValueError, match=message):
+        zones.parse_zones(config)
+
+
+def test_prepare_zones_builds_bbox_mask_and_buffer():
+    parsed = zones.parse_zones([LEFT, dict(RIGHT, active=False)])
+    left, right = zones.prepare_zones(parsed, (100, 100, 3))
+
+    assert left["bbox"] == (0, 0, 60, 100)
+    assert left["mask"].shape == (100, 60)
+    assert left["buffer"].shape == (100, 60, 3)
+    assert right["bbox"] == (40, 0, 100, 100)
+    assert right["buffer"] is None  # Inactive zones are never scanned
+
+
+def test_masked_crop_reuses_buffer_and_blanks_outside_polygon():
+    zone, = zones.prepare_zones(zones.parse_zones([TRIANGLE]), (100, 100, 3))
+    frame = np.full((100, 100, 3), 200, dtype=np.uint8)
+
+    crop = zones.masked_crop(frame, zone)
+    assert crop is zone["buffer"]
+    assert crop[5, 5].tolist() == [200, 200, 200]  # Inside, near the right angle
+    assert crop[95, 95].tolist() == [0, 0, 0]  # Outside the hypotenuse
+
+    frame[:] = 50
+    assert zones.masked_crop(frame, zone) is crop
+    assert crop[5, 5].tolist() == [50, 50, 50]
+    assert crop[95, 95].tolist() == [0, 0, 0]
+
+
+def test_zones_containing_labels_overlap():
+    prepared = zones.prepare_zones(zones.parse_zones([LEFT, RIGHT]), (100, 100, 3))
+
+    assert zones.zones_containing(prepared, (10, 50)) == ["left"]
+    assert zones.zones_containing(prepared, (50, 50)) == ["left", "right"]
+    assert zones.zones_containing(prepared, (90, 50)) == ["right"]
+
+
+def test_overlapping_zones_report_each_face_once(face_engine, monkeypatch):
+    everywhere = {"name": "everywhere", "polygon": [[0, 0], [1, 0], [1, 1], [0, 1]], "active": False}
+    prepared = zones.prepare_zones(zones.parse_zones([LEFT, RIGHT, everywhere]), (100, 100, 3))
+    frame = np.full((100, 100, 3), 120, dtype=np.uint8)
+    face = (40, 55, 60, 45)  # Centered at (50, 50), inside both active zones
+    scanned, encoded = [], []
+
+    def locate_faces(crop):
+        # Report the face in the crop's own coordinates
+        zone = next(z for z in prepared if z["buffer"] is crop)
+        scanned.append(zone["name"])
+        x0, y0, _, _ = zone["bbox"]
+        top, right, bottom, left = face
+        return [(top - y0, right - x0, bottom - y0, left - x0)]
+
+    def encode_faces(image, locations):
+        encoded.append((image, list(locations)))
+        return [np.zeros(128) for _ in locations]
+
+    monkeypatch.setattr(face_engine, "locate_faces", locate_faces)
+    monkeypatch.setattr(face_engine, "encode_faces", encode_faces)
+
+    results = face_engine.detect_faces_in_zones(frame, prepared)
+
+    assert scanned == ["left", "right"]
+    assert len(results) == 1
+    _, location, names = results[0]
+    assert location == face
+    assert names == ["left", "right", "everywhere"]
+
+    # Encodings come from the unmasked frame, in frame coordinates
+    image, locations = encoded[0]
+    assert image is frame
+    assert locations == [face]
@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional, Tuple
+
+# Per-session region-of-interest zones.
+#
+# A zone is configured as {"name": str, "polygon": [[x, y], ...], "active": bool}
+# with coordinates normalized to 0..1 of the frame width/height, so the same
+# config works at any camera resolution. Detection only runs on the bounding
+# crops of active zones (pixels outside the polygon are blanked); inactive
+# zones are only used to label events with zone membership, so at least one
+# zone must be active.
+#
+# cv2/numpy are imported inside functions so main.py can validate zone configs
+# without paying for them at import time.
+
+def _polygon_area(points: List[Tuple[float, float]]) -> float:
+    """Shoelace area of a polygon in normalized units."""
+    return abs(sum(
+        x0 * y1 - x1 * y0
+        for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])
+    )) / 2
+
+def parse_zones(zone_configs) -> List[Dict]:
+    """
+    Validate zone configs from the start-surveillance request.
+    Raises ValueError with a user-facing message on bad input.
+    """
+    if zone_configs is None:
+        return []
+    if not isinstance(zone_configs, list):
+        raise ValueError("zones must be a list")
+
+    zones = []
+    names = set()
+    for i, config in enumerate(zone_configs):
+        if not isinstance(config, dict):
+            raise ValueError(f"zone {i} must be an object")
+
+        name = config.get("name")
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"zone {i} needs a name")
+        if name in names:
+            raise ValueError(f"duplicate zone name: {name}")
+        names.add(name)
+
+        polygon = config.get("polygon")
+        if not isinstance(polygon, list) or len(polygon) < 3:
+            raise ValueError(f"zone {name} needs a polygon with at least 3 points")
+        points = []
+        for point in polygon:
+            if (not isinstance(point, (list, tuple)) or len(point) != 2
+                    or not all(isinstance(v, (int, float)) and not isinstance(v, bool) and 0 <= v <= 1 for v in point)):
+                raise ValueError(f"zone {name} points must be [x, y] pairs between 0 and 1")
+            points.append((float(point[0]), float(point[1])))
+        if _polygon_area(points) == 0:
+            raise ValueError(f"zone {name} polygon has no area")
+
+        active = config.get("active", True)
+        if not isinstance(active, bool):
+            raise ValueError(f"zone {name} active must be true or false")
+
+        zones.append({
+            "name": name,
+            "polygon": points,
+            "active": active,
+        })
+
+    if zones and not any(zone["active"] for zone in zones):
+        raise ValueError("at least one zone must be active")
+    return zones
+
+def prepare_zones(zones: List[Dict], frame_shape: Tuple[int, ...]) -> List[Dict]:
+    """
+    Precompute pixel bounding boxes, crop masks and crop buffers for a frame
+    size, so the per-frame path does not allocate masks.
+    """
+    import cv2
+    import numpy as np
+
+    height, width = frame_shape[:2]
+    prepared = []
+    for zone in zones:
+        pts = np.array(
+            [[round(x * (width - 1)), round(y * (height - 1))] for x, y in zone["polygon"]],
+            dtype=np.int32
+        )
+        x, y, w, h = cv2.boundingRect(pts)
+        if w == 0 or h == 0:
+            continue
+
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.fillPoly(mask, [pts - [x, y]], 255)
+
+        prepared.append({
+            "name": zone["name"],
+            "active": zone["active"],
+            "bbox": (x, y, x + w, y + h),
+            "mask": mask,
+            "buffer": np.zeros((h, w, 3), dtype=np.uint8) if zone["active"] else None,
+        })
+    return prepared
+
+def masked_crop(frame, zone: Dict):
+    """Return the zone's bounding crop with pixels outside the polygon blanked."""
+    import cv2
+
+    x0, y0, x1, y1 = zone["bbox"]
+    crop = frame[y0:y1, x0:x1]
+    buffer = zone["buffer"]
+    buffer.fill(0)
+    cv2.copyTo(crop, zone["mask"], buffer)
+    return buffer
+
+def zones_containing(zones: List[Dict], point: Tuple[int, int]) -> List[str]:
+    """Names of the zones whose polygon contains the (x, y) pixel."""
+    x, y = point
+    names = []
+    for zone in zones:
+        x0, y0, x1, y1 = zone["bbox"]
+        if x0 <= x < x1 and y0 <= y < y1 and zone["mask"][y - y0, x - x0]:
+            names.append(zone["name"])
+    return names
+
+def face_center(location: Tuple[int, int, int, int]) -> Tuple[int, int]:
+    """Center (x, y) of a face_recognition (top, right, bottom, left) box."""
+    top, right, bottom, left = location
+    return ((left + right) // 2, (top + bottom) // 2)
+
+def describe_zones(zones: Optional[List[Dict]]) -> List[Dict]:
+    """Zone summary for the /status endpoint."""
+    return [{"name": z["name"], "active": z["active"]} for z in zones or []]